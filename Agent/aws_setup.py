@@ -1,18 +1,29 @@
 """AWS IAM setup utilities for Agent deployment."""
 
 import boto3
+import functools
+import hashlib
 import json
 import time
+from string import Template
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
 from boto3.session import Session
 from botocore.exceptions import ClientError
 
-from config import AGENT_NAME
+from config import AGENT_NAME, PARAMETER_NAME, SECRETS_NAME
 
 # Role naming template
 ROLE_NAME_TEMPLATE = 'agentcore-{agent_name}-role'
 POLICY_NAME = 'AgentExecutionPolicy'
 
+# Backoff schedule (seconds) while waiting for a new role to become visible,
+# capped at ROLE_CREATION_WAIT_SECONDS in total
+ROLE_POLL_DELAYS = (0.5, 1, 2, 4, 8)
+ROLE_CREATION_WAIT_SECONDS = 10
 
+
+@functools.lru_cache(maxsize=1)
 def _get_aws_session():
     """Get AWS session and region.
 
@@ -23,6 +34,30 @@ def _get_aws_session():
     return session, session.region_name
 
 
+@functools.lru_cache(maxsize=1)
+def _get_account_id():
+    """Get the caller's AWS account ID.
+
+    Returns:
+        str: AWS account ID
+    """
+    return boto3.client("sts").get_caller_identity()["Account"]
+
+
+@functools.lru_cache(maxsize=1)
+def _get_region_and_account():
+    """Resolve region and account ID concurrently, once per process.
+
+    Returns:
+        tuple: (region name, account ID)
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        session_future = executor.submit(_get_aws_session)
+        account_future = executor.submit(_get_account_id)
+        _, region = session_future.result()
+        return region, account_future.result()
+
+
 def _get_role_policy(region, account_id, agent_name):
     """Get IAM role policy document.
 
@@ -56,7 +91,10 @@ def _get_role_policy(region, account_id, agent_name):
                     "secretsmanager:UpdateSecret",
                     "secretsmanager:CreateSecret"
                 ],
-                "Resource": "*"
+                "Resource": (
+                    f"arn:aws:secretsmanager:{region}:{account_id}:"
+                    f"secret:{SECRETS_NAME}*"
+                )
             },
             {
                 "Sid": "SSMParameterAccess",
@@ -66,7 +104,10 @@ def _get_role_policy(region, account_id, agent_name):
                     "ssm:GetParameters",
                     "ssm:PutParameter"
                 ],
-                "Resource": "*"
+                "Resource": (
+                    f"arn:aws:ssm:{region}:{account_id}:"
+                    f"parameter{PARAMETER_NAME}"
+                )
             },
             {
                 "Sid": "SupportAPIAccess",
@@ -113,7 +154,7 @@ def _get_role_policy(region, account_id, agent_name):
                 "Action": [
                     "bedrock-agentcore:InvokeAgentRuntime"
                 ],
-                "Resource": "*"
+                "Resource": f"arn:aws:bedrock-agentcore:{region}:{account_id}:*"
             },
             {
                 "Sid": "BedrockAgentCoreMemoryCreateMemory",
@@ -121,7 +162,7 @@ def _get_role_policy(region, account_id, agent_name):
                 "Action": [
                     "bedrock-agentcore:CreateMemory"
                 ],
-                "Resource": "*"
+                "Resource": f"arn:aws:bedrock-agentcore:{region}:{account_id}:*"
             },
             {
                 "Sid": "BedrockAgentCoreMemory",
@@ -139,7 +180,7 @@ def _get_role_policy(region, account_id, agent_name):
                     "bedrock-agentcore:DeleteMemoryRecord",
                     "bedrock-agentcore:RetrieveMemoryRecords"
                 ],
-                "Resource": "*"
+                "Resource": f"arn:aws:bedrock-agentcore:{region}:{account_id}:*"
             },
             {
                 "Sid": "BedrockAgentCoreIdentityGetResourceApiKey",
@@ -147,7 +188,7 @@ def _get_role_policy(region, account_id, agent_name):
                 "Action": [
                     "bedrock-agentcore:GetResourceApiKey"
                 ],
-                "Resource": "*"
+                "Resource": f"arn:aws:bedrock-agentcore:{region}:{account_id}:*"
             },
             {
                 "Sid": "BedrockAgentCoreIdentityGetResourceOauth2Token",
@@ -155,7 +196,7 @@ def _get_role_policy(region, account_id, agent_name):
                 "Action": [
                     "bedrock-agentcore:GetResourceOauth2Token"
                 ],
-                "Resource": "*"
+                "Resource": f"arn:aws:bedrock-agentcore:{region}:{account_id}:*"
             },
             {
                 "Sid": "BedrockAgentCoreIdentityGetWorkloadAccessToken",
@@ -165,7 +206,7 @@ def _get_role_policy(region, account_id, agent_name):
                     "bedrock-agentcore:GetWorkloadAccessTokenForJWT",
                     "bedrock-agentcore:GetWorkloadAccessTokenForUserId"
                 ],
-                "Resource": "*"
+                "Resource": f"arn:aws:bedrock-agentcore:{region}:{account_id}:*"
             },
             {
                 "Sid": "BedrockModelInvocation",
@@ -209,6 +250,16 @@ def _get_assume_role_policy(region, account_id):
     }
 
 
+# Policy documents serialized once at import with ${region}/${account_id}
+# placeholders, substituted per call.
+_ROLE_POLICY_TEMPLATE = Template(
+    json.dumps(_get_role_policy('${region}', '${account_id}', None))
+)
+_ASSUME_ROLE_POLICY_TEMPLATE = Template(
+    json.dumps(_get_assume_role_policy('${region}', '${account_id}'))
+)
+
+
 def get_existing_role_arn(agent_name):
     """Check if role already exists and return its ARN.
 
@@ -230,6 +281,38 @@ def get_existing_role_arn(agent_name):
         raise
 
 
+def _wait_for_role(iam_client, role_name):
+    """Wait until a newly created role is visible to IAM.
+
+    Polls get_role with capped exponential backoff, waiting at most
+    ROLE_CREATION_WAIT_SECONDS in total.
+
+    Args:
+        iam_client: Boto3 IAM client
+        role_name (str): Name of the role to wait for
+
+    Raises:
+        TimeoutError: If the role is still not visible after the wait
+    """
+    waited = 0
+    # Trailing 0 gives one last poll after the final sleep
+    for delay in ROLE_POLL_DELAYS + (0,):
+        try:
+            iam_client.get_role(RoleName=role_name)
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'NoSuchEntity':
+                raise
+        delay = min(delay, ROLE_CREATION_WAIT_SECONDS - waited)
+        if delay <= 0:
+            break
+        time.sleep(delay)
+        waited += delay
+
+    raise TimeoutError(
+        f"Role {role_name} not visible after {ROLE_CREATION_WAIT_SECONDS}s")
+
+
 def create_agentcore_role(agent_name):
     """Create IAM role for AgentCore with proper permissions.
 
@@ -241,26 +324,29 @@ def create_agentcore_role(agent_name):
     """
     iam_client = boto3.client('iam')
     role_name = ROLE_NAME_TEMPLATE.format(agent_name=agent_name)
-    _, region = _get_aws_session()
-    account_id = boto3.client("sts").get_caller_identity()["Account"]
+    region, account_id = _get_region_and_account()
 
     # Get policy documents
-    role_policy = _get_role_policy(region, account_id, agent_name)
-    assume_role_policy = _get_assume_role_policy(region, account_id)
+    role_policy_json = _ROLE_POLICY_TEMPLATE.substitute(
+        region=region, account_id=account_id
+    )
+    assume_role_policy_json = _ASSUME_ROLE_POLICY_TEMPLATE.substitute(
+        region=region, account_id=account_id
+    )
 
     try:
         # Create role
         role = iam_client.create_role(
             RoleName=role_name,
-            AssumeRolePolicyDocument=json.dumps(assume_role_policy),
+            AssumeRolePolicyDocument=assume_role_policy_json,
             Description=f'Execution role for Bedrock AgentCore agent: {agent_name}'
         )
-        time.sleep(10)  # Wait for role creation
+        _wait_for_role(iam_client, role_name)
 
         # Attach policy
         policy_name = f"{POLICY_NAME}-{agent_name}"
         iam_client.put_role_policy(
-            PolicyDocument=json.dumps(role_policy),
+            PolicyDocument=role_policy_json,
             PolicyName=policy_name,
             RoleName=role_name
         )
@@ -276,20 +362,68 @@ def create_agentcore_role(agent_name):
         raise
 
 
+def _policy_digest(policy):
+    """Hash a policy document independent of key order and encoding.
+
+    Args:
+        policy (dict or str): Policy document, or its (URL-encoded) JSON
+
+    Returns:
+        str: SHA-256 hex digest of the canonical JSON
+    """
+    if isinstance(policy, str):
+        policy = json.loads(unquote(policy))
+    canonical = json.dumps(policy, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _get_current_role_policy(iam_client, role_name, policy_name):
+    """Get the inline policy currently attached to a role.
+
+    Args:
+        iam_client: Boto3 IAM client
+        role_name (str): Name of the IAM role
+        policy_name (str): Name of the inline policy
+
+    Returns:
+        dict or str or None: Policy document, None if not attached
+    """
+    try:
+        response = iam_client.get_role_policy(
+            RoleName=role_name,
+            PolicyName=policy_name
+        )
+        return response['PolicyDocument']
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchEntity':
+            return None
+        raise
+
+
 def ensure_role_policy_updated(role_name, agent_name):
     """Ensure role has the latest policy definition"""
     iam_client = boto3.client('iam')
-    _, region = _get_aws_session()
-    account_id = boto3.client("sts").get_caller_identity()["Account"]
+    region, account_id = _get_region_and_account()
 
     # Get the expected policy
-    expected_policy = _get_role_policy(region, account_id, agent_name)
+    expected_policy_json = _ROLE_POLICY_TEMPLATE.substitute(
+        region=region, account_id=account_id
+    )
     policy_name = f"{POLICY_NAME}-{agent_name}"
 
     try:
+        # Skip the write when the attached policy already matches
+        current_policy = _get_current_role_policy(
+            iam_client, role_name, policy_name)
+        if (current_policy is not None and
+                _policy_digest(current_policy) ==
+                _policy_digest(expected_policy_json)):
+            print("✅ Role policy already matches code definition")
+            return
+
         # Update the policy to match current definition
         iam_client.put_role_policy(
-            PolicyDocument=json.dumps(expected_policy),
+            PolicyDocument=expected_policy_json,
             PolicyName=policy_name,
             RoleName=role_name
         )
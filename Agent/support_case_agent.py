@@ -1,24 +1,61 @@
 
 import asyncio
-import boto3
+import atexit
+import base64
 import json
+import os
+import queue
+import threading
+import time
+from contextlib import ExitStack
 from strands import Agent
 from bedrock_agentcore.runtime import BedrockAgentCoreApp
 from boto3.session import Session
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from datetime import timedelta
 from strands.tools.mcp import MCPClient
+from strands.types.exceptions import MCPClientInitializationError
 from mcp.client.streamable_http import streamablehttp_client
 from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# 优先使用 orjson 做 secret / JWT 的 JSON 编解码，未安装时退回标准库 json
+try:
+    import orjson
+    _dumps = lambda obj: orjson.dumps(obj).decode()
+    _loads = orjson.loads
+except ImportError:
+    _dumps, _loads = json.dumps, json.loads
 
 
 # 配置日志
-logging.basicConfig(
-#    filename='application.log',  # 日志文件名
-    level=logging.INFO,          # 日志级别
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # 日志格式
+# 协程中只把日志记录放入队列，由 QueueListener 后台线程负责实际写出，避免 I/O 阻塞事件循环
+_log_formatter = logging.Formatter(
+    fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',  # 日志格式
     datefmt='%Y-%m-%d %H:%M:%S'  # 日期格式
 )
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(_log_formatter)
+_log_handlers = [_log_handler]
+# 设置 APPLICATION_LOG_FILE（如 application.log）时额外写入按大小轮转的日志文件；
+# delay=True 首次写入时才打开文件，轮转在 QueueListener 线程中完成
+LOG_FILE = os.environ.get("APPLICATION_LOG_FILE")
+if LOG_FILE:
+    _file_handler = RotatingFileHandler(
+        LOG_FILE, maxBytes=50 * 1024 * 1024, backupCount=3, delay=True
+    )
+    _file_handler.setFormatter(_log_formatter)
+    _log_handlers.append(_file_handler)
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+_root_logger = logging.getLogger()
+_root_logger.setLevel(logging.INFO)  # 日志级别
+_root_logger.addHandler(QueueHandler(_log_queue))  # 格式化统一交给 _log_handler
+_log_listener.start()
+atexit.register(_log_listener.stop)  # 退出时刷新队列中剩余的日志
 
 # ============ 全局配置 ============
 
@@ -29,22 +66,49 @@ REGION = boto_session.region_name
 SECRET_ID = "support_mcp_server/cognito/credentials"
 SSM_AGENT_ARN_PARAM = "/support_mcp_server/runtime/agent_arn"
 
+# 复用 boto3 客户端：模块加载时创建一次，后续调用共享连接池，避免重复建连和 TLS 握手
+# 开启 TCP keepalive 防止空闲连接被 NAT 网关回收；连接池放大以支持并发流式会话
+_BOTO_CONFIG = Config(
+    tcp_keepalive=True,
+    max_pool_connections=64,
+    retries={"mode": "adaptive", "max_attempts": 6},
+    connect_timeout=3,
+    read_timeout=15
+)
+# Secrets / Cognito 位于 token 刷新路径，放宽重试次数，由 botocore 吸收限流和 5xx
+_AUTH_BOTO_CONFIG = _BOTO_CONFIG.merge(Config(retries={"mode": "adaptive", "max_attempts": 8}))
+_SECRETS = boto_session.client('secretsmanager', region_name=REGION, config=_AUTH_BOTO_CONFIG)
+_SSM = boto_session.client('ssm', region_name=REGION, config=_BOTO_CONFIG)
+_COGNITO = boto_session.client('cognito-idp', region_name=REGION, config=_AUTH_BOTO_CONFIG)
+
+# Secrets 进程内缓存（秒），仅在过期或 refresh_token 后更新
+SECRET_CACHE_TTL = 600
+_CACHE = {}  # key -> (value, expiry)
+_CACHE_LOCK = threading.Lock()
+# agent ARN 在进程生命周期内不变，MCP URL 首次使用时拼接一次
+_MCP_URL = None
+
+# MCP 客户端和工具列表跨请求复用，在 bearer token 过期前（秒）、超过最长存活/空闲时间、刷新后或调用失败后重建
+MCP_CLIENT_EXPIRY_MARGIN = 60
+MCP_CLIENT_MAX_AGE = 1800  # 客户端最长存活时间，token 有效期更长时也不超过该值
+MCP_CLIENT_IDLE_TIMEOUT = 600  # 低于 AgentCore runtime 会话空闲超时（默认 15 分钟），避免复用已被回收的会话
+# current: {"stack", "tools", "expiry", "last_used", "refs", "retired"}；被替换的客户端等引用它的请求结束后再关闭
+_MCP_STATE = {"current": None}
+_MCP_LOCK = asyncio.Lock()
+
+# 并发请求同时检测到 token 失效时只刷新一次
+_REFRESH_LOCK = asyncio.Lock()
+_last_token_refresh = 0.0  # 最近一次刷新成功的 time.monotonic()
+
 app = BedrockAgentCoreApp()
 
 
 # 配置system prompt
-def get_system_prompt() -> str:
-    """
-    Return the full system prompt for the AWS Support Case Management Agent,
-    including dynamic current Beijing Time (UTC+8).
-    """
-    # 获取当前北京时间
-    beijing_tz = timezone(timedelta(hours=8))
-    now_bj = datetime.now(beijing_tz)
-    current_time_str = now_bj.strftime("%Y-%m-%d %H:%M:%S %Z")
+# 北京时间 (UTC+8)
+BEIJING_TZ = timezone(timedelta(hours=8))
 
-    # 定义 system prompt
-    system_prompt = f"""
+# system prompt 模板在模块加载时定义一次，每次调用只替换当前时间
+_SYSTEM_PROMPT_TMPL = """
 # AWS Support Case Management Agent - Cross-border E-commerce IT Support
 
 ## Current Reference Time
@@ -96,26 +160,149 @@ You can create, query, analyze, and provide strategic insights on AWS Support ca
 
 Remember: Your primary goal is to help e-commerce IT teams maintain robust, secure, and high-performing AWS infrastructure that supports their business objectives while minimizing operational risks and maximizing customer satisfaction.
 """
-    return system_prompt
+
+
+def get_system_prompt() -> str:
+    """
+    Return the full system prompt for the AWS Support Case Management Agent,
+    including dynamic current Beijing Time (UTC+8).
+    """
+    # 获取当前北京时间
+    current_time_str = datetime.now(BEIJING_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+    return _SYSTEM_PROMPT_TMPL.replace("{current_time_str}", current_time_str)
 
 
 
 # =============== 核心封装 ===============
-async def _run_once(user_input: str, system_prompt: str):
-    """封装一次完整的 MCP 调用逻辑"""
-    logging.info(f"建立 MCP 连接")
-    streamable_http_mcp_client = MCPClient(create_streamable_http_transport)
+class TokenExpiredError(Exception):
+    """MCP 连接因 bearer token 失效而无法建立"""
+
+
+async def _close_mcp_entry(entry):
+    await asyncio.to_thread(entry["stack"].close)
+
+
+async def _retire_mcp_client(entry):
+    """将 MCP 客户端移出缓存；仍有请求在使用时推迟到最后一个请求释放后再关闭"""
+    if entry is None or entry["retired"]:
+        return
+    if _MCP_STATE["current"] is entry:
+        _MCP_STATE["current"] = None
+    entry["retired"] = True
+    if entry["refs"] == 0:
+        await _close_mcp_entry(entry)
+
+
+async def _release_mcp_client(entry):
+    """请求结束时释放 MCP 客户端引用，已被替换的客户端在最后一个引用释放后关闭"""
+    entry["refs"] -= 1
+    entry["last_used"] = time.time()
+    if entry["retired"] and entry["refs"] == 0:
+        await _close_mcp_entry(entry)
+
 
-    with streamable_http_mcp_client:
-        logging.info(f"获取 MCP 工具列表")
-        logging.info(f"Current Time9: {datetime.now()}")
-        tools = streamable_http_mcp_client.list_tools_sync()
+async def _get_bearer_token_expiry():
+    """读取缓存 secret 中 bearer token 的过期时间，缓存过期时的 Secrets Manager 调用放到线程中执行"""
+    secret = await asyncio.to_thread(_cache_get, "secret", _load_secret, SECRET_CACHE_TTL)
+    return _get_token_expiry(secret['bearer_token'])
+
+
+async def _refresh_token_if_expiring(attempt_started: float):
+    """token 已进入过期余量时先单飞刷新，避免用即将过期的旧 token 反复重建 MCP 连接"""
+    token_exp = await _get_bearer_token_expiry()
+    if token_exp is None or time.time() < token_exp - MCP_CLIENT_EXPIRY_MARGIN:
+        return
+    logging.info("bearer token 即将过期，提前 refresh_token")
+    try:
+        await _refresh_token_once(attempt_started)
+    except ClientError as e:
+        # 旧 token 可能仍在有效期内，继续建连；真正失效时由 run_with_retry 再次刷新
+        logging.warning("提前刷新 token 失败，继续使用当前 token: %s", e)
+
+
+def _is_usable(entry):
+    """未过期，且仍有请求在使用或空闲时间未超过 MCP_CLIENT_IDLE_TIMEOUT"""
+    if entry is None:
+        return False
+    now = time.time()
+    idle = entry["refs"] == 0 and now - entry["last_used"] >= MCP_CLIENT_IDLE_TIMEOUT
+    return now < entry["expiry"] and not idle
+
+
+async def _acquire_mcp_client(attempt_started: float):
+    """返回缓存的 MCP 客户端并增加引用计数；首次使用、token 即将过期、超过存活或空闲时间、被刷新或调用失败后重新建立 MCP 连接"""
+    async with _MCP_LOCK:
+        entry = _MCP_STATE["current"]
+        if _is_usable(entry):
+            entry["refs"] += 1
+            return entry
+
+    await _refresh_token_if_expiring(attempt_started)
+
+    async with _MCP_LOCK:
+        entry = _MCP_STATE["current"]
+        if _is_usable(entry):
+            # 等锁期间其他请求已完成重建
+            entry["refs"] += 1
+            return entry
+        await _retire_mcp_client(entry)
+
+        logging.info(f"建立 MCP 连接")
+        streamable_http_mcp_client = MCPClient(create_streamable_http_transport)
+
+        # MCPClient 的建连、工具列表和关闭都是同步阻塞调用，放到线程中执行，避免阻塞事件循环
+        stack = ExitStack()
+        try:
+            await asyncio.to_thread(stack.enter_context, streamable_http_mcp_client)
+        except MCPClientInitializationError as e:
+            # MCP 初始化握手被拒绝，视为 token 失效，交给 run_with_retry 刷新
+            raise TokenExpiredError(str(e)) from e
+        try:
+            logging.info(f"获取 MCP 工具列表")
+            tools = await asyncio.to_thread(streamable_http_mcp_client.list_tools_sync)
+            token_exp = await _get_bearer_token_expiry()
+        except Exception:
+            await asyncio.to_thread(stack.close)
+            raise
         logging.info(f"✓ 找到 {len(tools)} 个工具")
 
+        built_at = time.time()
+        expiry = built_at + MCP_CLIENT_MAX_AGE
+        if token_exp is not None:
+            expiry = min(expiry, token_exp - MCP_CLIENT_EXPIRY_MARGIN)
+        entry = {"stack": stack, "tools": tools, "expiry": expiry, "last_used": built_at,
+                 "refs": 1, "retired": False}
+        _MCP_STATE["current"] = entry
+        return entry
+
+
+async def _reset_mcp_client(entry=None):
+    """丢弃缓存的 MCP 客户端（默认为当前客户端），下次请求重新建连"""
+    async with _MCP_LOCK:
+        await _retire_mcp_client(entry if entry is not None else _MCP_STATE["current"])
+
+
+async def _refresh_token_once(attempt_started: float):
+    """单飞刷新 token：若本次请求开始后已有其他请求完成刷新，直接复用新 token"""
+    global _last_token_refresh
+    async with _REFRESH_LOCK:
+        if _last_token_refresh > attempt_started:
+            logging.info("token 已被其他请求刷新，跳过 refresh_token")
+            return
+        await asyncio.to_thread(refresh_token)  # 刷新 token（同步 boto3 调用，放到线程中执行）
+        await _reset_mcp_client()
+        _last_token_refresh = time.monotonic()
+
+
+async def _run_once(user_input: str, system_prompt: str, attempt_started: float):
+    """封装一次完整的 MCP 调用逻辑"""
+    entry = await _acquire_mcp_client(attempt_started)
+    try:
+        # Agent 持有对话历史，每个请求单独创建，只复用 MCP 连接和工具列表
         logging.info(f"创建 Agent..")
         agent = Agent(
             model="us.anthropic.claude-sonnet-4-5-20250929-v1:0",
-            tools=tools,
+            tools=entry["tools"],
             system_prompt=system_prompt
         )
 
@@ -125,46 +312,90 @@ async def _run_once(user_input: str, system_prompt: str):
             if "data" in event:
                 yield event["data"]
         print("✅ 流式查询执行完成")
+    except Exception:
+        # MCP 会话可能已断开（服务端重启、后台线程退出、流中途 401），丢弃该客户端，下次请求重新建连
+        await _reset_mcp_client(entry)
+        raise
+    finally:
+        await _release_mcp_client(entry)
 
 
 async def run_with_retry(user_input: str, system_prompt: str):
     """带 token 自动刷新的一次重试封装"""
+    attempt_started = time.monotonic()
     try:
         # 第一次尝试
-        async for data in _run_once(user_input, system_prompt):
+        async for data in _run_once(user_input, system_prompt, attempt_started):
             yield data
+    except TokenExpiredError as e:
+        logging.warning(f"第一次失败: {e}")
+        logging.info("检测到 token 失效，尝试 refresh_token 后重试...")
+        try:
+            await _refresh_token_once(attempt_started)
+            async for data in _run_once(user_input, system_prompt, attempt_started):
+                yield data
+        except Exception as e2:
+            logging.error(f"刷新 token 后仍然失败: {e2}")
+            yield {"error": str(e2), "type": "stream_error"}
     except Exception as e:
-        err_msg = str(e)
-        logging.warning(f"第一次失败: {err_msg}")
+        # 非 token 错误，直接返回
+        logging.warning(f"第一次失败: {e}")
+        yield {"error": str(e), "type": "stream_error"}
+
+
 
-        # ✅ 判断是否 token 过期错误
-        if "client initialization failed" in err_msg.lower():
-            logging.info("检测到 token 失效，尝试 refresh_token 后重试...")
-            try:
-                refresh_token()  # 刷新 token
-                async for data in _run_once(user_input, system_prompt):
-                    yield data
-            except Exception as e2:
-                logging.error(f"刷新 token 后仍然失败: {e2}")
-                yield {"error": str(e2), "type": "stream_error"}
-        else:
-            # 非 token 错误，直接返回
-            yield {"error": err_msg, "type": "stream_error"}
+def _cache_put(key, value, ttl):
+    with _CACHE_LOCK:
+        _CACHE[key] = (value, time.monotonic() + ttl)
 
 
+def _cache_get(key, loader, ttl):
+    """返回缓存值；缓存缺失或过期时调用 loader 重新获取"""
+    with _CACHE_LOCK:
+        entry = _CACHE.get(key)
+        if entry and time.monotonic() < entry[1]:
+            return entry[0]
+    value = loader()
+    _cache_put(key, value, ttl)
+    return value
+
+
+def _get_mcp_url():
+    """首次调用时从 SSM 读取 agent ARN 并拼接 MCP URL，之后直接复用"""
+    global _MCP_URL
+    if _MCP_URL is None:
+        agent_arn_response = _SSM.get_parameter(Name=SSM_AGENT_ARN_PARAM)
+        agent_arn = agent_arn_response['Parameter']['Value']
+        logging.info("Retrieved Agent ARN: %s", agent_arn)
+        _MCP_URL = f"https://bedrock-agentcore.{REGION}.amazonaws.com/runtimes/{quote(agent_arn, safe='')}/invocations?qualifier=DEFAULT"
+        logging.info("MCP URL configured: %s", _MCP_URL)
+    return _MCP_URL
+
+
+def _get_token_expiry(bearer_token):
+    """解析 JWT 中的 exp（epoch 秒），无法解析时返回 None"""
+    try:
+        payload = bearer_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return _loads(base64.urlsafe_b64decode(payload))['exp']
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _load_secret():
+    response = _SECRETS.get_secret_value(SecretId=SECRET_ID)
+    return _loads(response['SecretString'])
+
 
 def refresh_token():
     try:
-        secrets_client = boto3.client('secretsmanager', region_name=REGION)
-        secrets_response = secrets_client.get_secret_value(SecretId=SECRET_ID)
-        secret_data = json.loads(secrets_response['SecretString'])
+        # 刷新路径始终读取最新 secret，不走缓存
+        secret_data = _load_secret()
         client_id = secret_data['client_id']
         AuthParameters_username = secret_data['AuthParameters']['USERNAME']
         AuthParameters_password = secret_data['AuthParameters']['PASSWORD']
-        logging.info(f"old secret data: {secret_data}")
         ##refresh access token
-        cognito_client = boto3.client('cognito-idp', region_name=REGION)
-        auth_response = cognito_client.initiate_auth(
+        auth_response = _COGNITO.initiate_auth(
             ClientId=client_id,
             AuthFlow='USER_PASSWORD_AUTH',
             AuthParameters={
@@ -174,37 +405,32 @@ def refresh_token():
         )
         refreshed_bearer_token = auth_response['AuthenticationResult']['AccessToken']
         secret_data['bearer_token'] = refreshed_bearer_token
-        logging.info(f"new data: {secret_data}")
-        update_response = secrets_client.update_secret(SecretId=SECRET_ID,SecretString=json.dumps(secret_data))
+        update_response = _SECRETS.update_secret(SecretId=SECRET_ID,SecretString=_dumps(secret_data))
+        _cache_put("secret", secret_data, SECRET_CACHE_TTL)
         logging.info("refresh success")
-    except Exception as e:
-        print(f"Refresh cognito access token failed: {e}")
-        raise e
+    except _COGNITO.exceptions.NotAuthorizedException as e:
+        # 用户名/密码被拒绝，重试无意义，直接上抛
+        logging.error("Refresh cognito access token failed, credentials rejected: %s", e)
+        raise
+    except ClientError as e:
+        # 限流和 5xx 已由 botocore 自适应重试处理，走到这里说明重试已耗尽或为不可重试错误
+        logging.error("Refresh cognito access token failed (%s): %s", e.response['Error']['Code'], e)
+        raise
 
 def create_streamable_http_transport():
     try:
-        # 你的现有配置代码（保持不变）
-        ssm_client = boto3.client('ssm', region_name=REGION)
-        agent_arn_response = ssm_client.get_parameter(Name=SSM_AGENT_ARN_PARAM)
-        agent_arn = agent_arn_response['Parameter']['Value']
-        logging.info(f"Retrieved Agent ARN: {agent_arn}")
+        mcp_url = _get_mcp_url()
 
-        secrets_client = boto3.client('secretsmanager', region_name=REGION)
-        response = secrets_client.get_secret_value(SecretId=SECRET_ID)
-        secret_value = response['SecretString']
-        parsed_secret = json.loads(secret_value)
+        parsed_secret = _cache_get("secret", _load_secret, SECRET_CACHE_TTL)
         bearer_token = parsed_secret['bearer_token']
-        logging.info(f"Retrieved bearer token: {bearer_token}")
+        # 不记录 token 明文，仅在 DEBUG 级别输出长度；使用 % 占位符以便级别过滤时跳过格式化
+        logging.debug("Retrieved bearer token (len=%d)", len(bearer_token))
 
-        encoded_arn = agent_arn.replace(':', '%3A').replace('/', '%2F')
-        mcp_url = f"https://bedrock-agentcore.{REGION}.amazonaws.com/runtimes/{encoded_arn}/invocations?qualifier=DEFAULT"
         headers = {
             "authorization": f"Bearer {bearer_token}",
             "Content-Type": "application/json"
         }
-        logging.info(f"MCP URL configured: {mcp_url}")
-        logging.info(f"创建 MCP 传输层")
-        logging.info(f"headers: {headers}")
+        logging.info("创建 MCP 传输层")
         return streamablehttp_client(mcp_url, headers, timeout=timedelta(seconds=120), terminate_on_close=False)
     except Exception as e:
         print(f"Error Message: {e}")
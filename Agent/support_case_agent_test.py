@@ -2,6 +2,7 @@ import boto3
 import json
 import pickle
 import os
+import sys
 from boto3.session import Session
 
 
@@ -40,18 +41,15 @@ def test_support_case_agent():
             if "text/event-stream" in boto3_response.get("contentType", ""):
                 print("Agent response:")
                 try:
-                    response_body = boto3_response["response"].read()
-                    # Parse and clean the streaming data
-                    lines = response_body.decode('utf-8').split('\n')
-                    content = []
-                    for line in lines:
+                    # Parse and print the streaming data as each line arrives
+                    for line in boto3_response["response"].iter_lines():
+                        line = line.decode('utf-8')
                         if line.startswith('data: '):
                             data = line[6:].strip('"')
                             if data and data != '\\n':
-                                content.append(data)
-
-                    full_response = ''.join(content).replace('\\n', '\n')
-                    print(full_response)
+                                sys.stdout.write(data.replace('\\n', '\n'))
+                                sys.stdout.flush()
+                    print()
                 except Exception as e:
                     print(f"Error reading response: {e}")
             else:
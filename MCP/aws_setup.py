@@ -1,27 +1,53 @@
 """AWS Cognito and AgentCore setup utilities for MCP server deployment."""
 
-import boto3
+import base64
+import functools
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
 from boto3.session import Session
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 from config import (
     CLIENT_NAME,
     COGNITO_DISCOVERY_URL_TEMPLATE,
     DEBUG_MODE,
+    IAM_CLEANUP_MAX_WORKERS,
+    MAX_CLIENTS_TO_LIST,
     MAX_POLICIES_TO_LIST,
     MAX_POOLS_TO_LIST,
     PASSWORD,
     POOL_NAME,
-    ROLE_CREATION_WAIT_SECONDS,
+    ROLE_WAITER_DELAY_SECONDS,
+    ROLE_WAITER_MAX_ATTEMPTS,
     ROLE_NAME_TEMPLATE, POLICY_NAME,
+    SECRETS_NAME,
+    THROTTLING_ERROR_CODES,
+    TOKEN_EXPIRY_MARGIN_SECONDS,
     USERNAME,
     AWS_SUPPORT_ACCESS_MANAGED_POLICY_ARN,
 )
 
 
+# Client configuration for every module in this package: keep-alive pooled
+# connections and adaptive retries to ride out throttling
+_BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    connect_timeout=3,
+    read_timeout=10
+)
+
+# Lazily created clients, one per service, built from the shared session
+_CLIENTS = {}
+
+
+@functools.lru_cache(maxsize=1)
 def _get_aws_session():
-    """Get AWS session and region.
+    """Get AWS session and region, created once per process.
 
     Returns:
         tuple: (Session object, region name)
@@ -30,6 +56,38 @@ def _get_aws_session():
     return session, session.region_name
 
 
+def get_client(service):
+    """Get a cached boto3 client for an AWS service.
+
+    Shared by the setup utilities and the MCP client test so every client
+    uses _BOTO_CONFIG.
+
+    Args:
+        service (str): AWS service name
+
+    Returns:
+        Boto3 client for the service
+    """
+    if service not in _CLIENTS:
+        session, region = _get_aws_session()
+        _CLIENTS[service] = session.client(
+            service,
+            region_name=region,
+            config=_BOTO_CONFIG
+        )
+    return _CLIENTS[service]
+
+
+@functools.lru_cache(maxsize=1)
+def _get_account_id():
+    """Get the caller's AWS account ID.
+
+    Returns:
+        str: AWS account ID
+    """
+    return get_client('sts').get_caller_identity()["Account"]
+
+
 def _authenticate_user(cognito_client, client_id):
     """Authenticate user and return bearer token.
 
@@ -48,6 +106,50 @@ def _authenticate_user(cognito_client, client_id):
     return auth_response['AuthenticationResult']['AccessToken']
 
 
+def get_token_expiry(bearer_token):
+    """Read the expiry time from a JWT bearer token.
+
+    Args:
+        bearer_token (str): JWT access token
+
+    Returns:
+        int or None: Expiry as epoch seconds, or None if unreadable
+    """
+    try:
+        payload = bearer_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))['exp']
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _get_stored_bearer_token(client_id):
+    """Get a still-valid bearer token from Secrets Manager.
+
+    Args:
+        client_id (str): Cognito client ID the token must belong to
+
+    Returns:
+        str or None: Bearer token, or None if missing, unreadable, expiring
+            or issued for a different client
+    """
+    # Only a cache lookup: any failure falls back to a fresh authentication
+    try:
+        response = get_client('secretsmanager').get_secret_value(
+            SecretId=SECRETS_NAME)
+        secret = json.loads(response['SecretString'])
+        if secret.get('client_id') != client_id:
+            return None
+    except (AttributeError, ClientError, ValueError):
+        return None
+
+    bearer_token = secret.get('bearer_token')
+    expiry = get_token_expiry(bearer_token)
+    if expiry is None or expiry <= time.time() + TOKEN_EXPIRY_MARGIN_SECONDS:
+        return None
+    return bearer_token
+
+
 def _find_existing_pool(cognito_client):
     """Find existing user pool and client.
 
@@ -57,35 +159,40 @@ def _find_existing_pool(cognito_client):
     Returns:
         tuple: (pool_id, client_id) or (None, None) if not found
     """
-    pools = cognito_client.list_user_pools(MaxResults=MAX_POOLS_TO_LIST)
-    for pool in pools['UserPools']:
-        if pool['Name'] == POOL_NAME:
-            clients = cognito_client.list_user_pool_clients(
-                UserPoolId=pool['Id']
-            )
-            for client in clients['UserPoolClients']:
+    pool_pages = cognito_client.get_paginator('list_user_pools').paginate(
+        PaginationConfig={'PageSize': MAX_POOLS_TO_LIST}
+    )
+    # Lazily filter by name so listing stops once a match is returned
+    matching_pool_ids = (
+        pool['Id']
+        for page in pool_pages
+        for pool in page['UserPools']
+        if pool['Name'] == POOL_NAME
+    )
+
+    client_paginator = cognito_client.get_paginator('list_user_pool_clients')
+    for pool_id in matching_pool_ids:
+        client_pages = client_paginator.paginate(
+            UserPoolId=pool_id,
+            PaginationConfig={'PageSize': MAX_CLIENTS_TO_LIST}
+        )
+        for page in client_pages:
+            for client in page['UserPoolClients']:
                 if client['ClientName'] == CLIENT_NAME:
-                    return pool['Id'], client['ClientId']
+                    return pool_id, client['ClientId']
     return None, None
 
 
-def _create_user_pool(cognito_client):
-    """Create new user pool and client.
+def _create_app_client(cognito_client, pool_id):
+    """Create the app client for a user pool.
 
     Args:
         cognito_client: Boto3 Cognito client
+        pool_id (str): Cognito user pool ID
 
     Returns:
-        tuple: (pool_id, client_id)
+        str: Cognito client ID
     """
-    # Create User Pool
-    user_pool_response = cognito_client.create_user_pool(
-        PoolName=POOL_NAME,
-        Policies={'PasswordPolicy': {'MinimumLength': 8}}
-    )
-    pool_id = user_pool_response['UserPool']['Id']
-
-    # Create App Client
     app_client_response = cognito_client.create_user_pool_client(
         UserPoolId=pool_id,
         ClientName=CLIENT_NAME,
@@ -95,9 +202,16 @@ def _create_user_pool(cognito_client):
             'ALLOW_REFRESH_TOKEN_AUTH'
         ]
     )
-    client_id = app_client_response['UserPoolClient']['ClientId']
+    return app_client_response['UserPoolClient']['ClientId']
+
 
-    # Create and configure user
+def _create_user(cognito_client, pool_id):
+    """Create the user and set its permanent password.
+
+    Args:
+        cognito_client: Boto3 Cognito client
+        pool_id (str): Cognito user pool ID
+    """
     cognito_client.admin_create_user(
         UserPoolId=pool_id,
         Username=USERNAME,
@@ -111,6 +225,31 @@ def _create_user_pool(cognito_client):
         Permanent=True
     )
 
+
+def _create_user_pool(cognito_client):
+    """Create new user pool and client.
+
+    Args:
+        cognito_client: Boto3 Cognito client
+
+    Returns:
+        tuple: (pool_id, client_id)
+    """
+    # Create User Pool
+    user_pool_response = cognito_client.create_user_pool(
+        PoolName=POOL_NAME,
+        Policies={'PasswordPolicy': {'MinimumLength': 8}}
+    )
+    pool_id = user_pool_response['UserPool']['Id']
+
+    # App client and user only depend on the pool, so create them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        client_future = executor.submit(
+            _create_app_client, cognito_client, pool_id)
+        user_future = executor.submit(_create_user, cognito_client, pool_id)
+        client_id = client_future.result()
+        user_future.result()
+
     return pool_id, client_id
 
 
@@ -119,9 +258,12 @@ def setup_cognito_user_pool():
 
     Returns:
         dict: Configuration dictionary with pool details, or None on error
+
+    Raises:
+        ClientError: If AWS throttling persists after client retries
     """
     _, region = _get_aws_session()
-    cognito_client = boto3.client('cognito-idp', region_name=region)
+    cognito_client = get_client('cognito-idp')
 
     try:
         # Check for existing pool first
@@ -129,12 +271,18 @@ def setup_cognito_user_pool():
 
         if pool_id and client_id:
             print(f"✅ Found existing user pool: {pool_id}")
+            # Reuse a still-valid token stored by a previous run
+            bearer_token = _get_stored_bearer_token(client_id)
         else:
             # Create new pool if none exists
             pool_id, client_id = _create_user_pool(cognito_client)
+            bearer_token = None
 
-        # Authenticate and get token
-        bearer_token = _authenticate_user(cognito_client, client_id)
+        if bearer_token:
+            print("✅ Reusing unexpired bearer token from Secrets Manager")
+        else:
+            # Authenticate and get token
+            bearer_token = _authenticate_user(cognito_client, client_id)
 
         discovery_url = COGNITO_DISCOVERY_URL_TEMPLATE.format(
             region=region,
@@ -159,7 +307,9 @@ def setup_cognito_user_pool():
 
         return config
 
-    except Exception as e:
+    except ClientError as e:
+        if e.response['Error']['Code'] in THROTTLING_ERROR_CODES:
+            raise
         print(f"❌ Error: {e}")
         return None
 
@@ -173,8 +323,7 @@ def reauthenticate_user(client_id):
     Returns:
         str: New bearer token
     """
-    _, region = _get_aws_session()
-    cognito_client = boto3.client('cognito-idp', region_name=region)
+    cognito_client = get_client('cognito-idp')
     return _authenticate_user(cognito_client, client_id)
 
 
@@ -309,6 +458,19 @@ def _get_assume_role_policy(region, account_id):
     }
 
 
+# Policy documents serialized once (compactly) at import with ${region}/
+# ${account_id}/${agent_name} placeholders, substituted per call.
+_COMPACT_SEPARATORS = (',', ':')
+_ROLE_POLICY_TEMPLATE = Template(json.dumps(
+    _get_role_policy('${region}', '${account_id}', '${agent_name}'),
+    separators=_COMPACT_SEPARATORS
+))
+_ASSUME_ROLE_POLICY_TEMPLATE = Template(json.dumps(
+    _get_assume_role_policy('${region}', '${account_id}'),
+    separators=_COMPACT_SEPARATORS
+))
+
+
 def _cleanup_existing_role(iam_client, role_name):
     """Clean up existing IAM role and its policies.
 
@@ -317,16 +479,35 @@ def _cleanup_existing_role(iam_client, role_name):
         role_name (str): Name of the role to clean up
     """
     print("⚠️ Role already exists -- recreating")
-    # Clean up existing policies
-    policies = iam_client.list_role_policies(
-        RoleName=role_name,
-        MaxItems=MAX_POLICIES_TO_LIST
-    )
-    for policy_name in policies['PolicyNames']:
-        iam_client.delete_role_policy(
-            RoleName=role_name,
-            PolicyName=policy_name
-        )
+    pagination = {'PageSize': MAX_POLICIES_TO_LIST}
+    inline_policies = [
+        policy_name
+        for page in iam_client.get_paginator('list_role_policies').paginate(
+            RoleName=role_name, PaginationConfig=pagination)
+        for policy_name in page['PolicyNames']
+    ]
+    managed_policies = [
+        policy['PolicyArn']
+        for page in iam_client.get_paginator(
+            'list_attached_role_policies').paginate(
+            RoleName=role_name, PaginationConfig=pagination)
+        for policy in page['AttachedPolicies']
+    ]
+
+    # Delete inline and detach managed policies concurrently; the role
+    # cannot be deleted while either is still attached
+    with ThreadPoolExecutor(max_workers=IAM_CLEANUP_MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(iam_client.delete_role_policy,
+                            RoleName=role_name, PolicyName=policy_name)
+            for policy_name in inline_policies
+        ] + [
+            executor.submit(iam_client.detach_role_policy,
+                            RoleName=role_name, PolicyArn=policy_arn)
+            for policy_arn in managed_policies
+        ]
+        for future in futures:
+            future.result()
 
     # Delete role
     iam_client.delete_role(RoleName=role_name)
@@ -342,17 +523,21 @@ def _add_managed_policy_to_role(role_name, policy_arn):
     Returns:
         dict: Response from AWS
     """
-    iam_client = boto3.client('iam')
+    iam_client = get_client('iam')
 
     try:
         # Check if policy is already attached
-        attached_policies = iam_client.list_attached_role_policies(
-            RoleName=role_name)
-        for policy in attached_policies['AttachedPolicies']:
-            if policy['PolicyArn'] == policy_arn:
-                print(
-                    f"✅ Managed policy {policy_arn} already attached to {role_name}")
-                return None
+        pages = iam_client.get_paginator(
+            'list_attached_role_policies').paginate(RoleName=role_name)
+        attached = {
+            policy['PolicyArn']
+            for page in pages
+            for policy in page['AttachedPolicies']
+        }
+        if policy_arn in attached:
+            print(
+                f"✅ Managed policy {policy_arn} already attached to {role_name}")
+            return None
 
         # Attach policy if not already attached
         response = iam_client.attach_role_policy(
@@ -375,34 +560,46 @@ def create_agentcore_role(agent_name):
     Returns:
         dict: Created IAM role response
     """
-    iam_client = boto3.client('iam')
+    iam_client = get_client('iam')
     role_name = ROLE_NAME_TEMPLATE.format(agent_name=agent_name)
     _, region = _get_aws_session()
-    account_id = boto3.client("sts").get_caller_identity()["Account"]
+    account_id = _get_account_id()
 
     # Get policy documents
-    role_policy = _get_role_policy(region, account_id, agent_name)
-    assume_role_policy = _get_assume_role_policy(region, account_id)
+    role_policy_json = _ROLE_POLICY_TEMPLATE.substitute(
+        region=region, account_id=account_id, agent_name=agent_name
+    )
+    assume_role_policy_json = _ASSUME_ROLE_POLICY_TEMPLATE.substitute(
+        region=region, account_id=account_id
+    )
 
     try:
         # Create role
         role = iam_client.create_role(
             RoleName=role_name,
-            AssumeRolePolicyDocument=json.dumps(assume_role_policy)
+            AssumeRolePolicyDocument=assume_role_policy_json
         )
-        time.sleep(ROLE_CREATION_WAIT_SECONDS)  # Wait for role creation
 
     except iam_client.exceptions.EntityAlreadyExistsException:
         _cleanup_existing_role(iam_client, role_name)
         role = iam_client.create_role(
             RoleName=role_name,
-            AssumeRolePolicyDocument=json.dumps(assume_role_policy)
+            AssumeRolePolicyDocument=assume_role_policy_json
         )
 
+    # Wait for role creation
+    iam_client.get_waiter('role_exists').wait(
+        RoleName=role_name,
+        WaiterConfig={
+            'Delay': ROLE_WAITER_DELAY_SECONDS,
+            'MaxAttempts': ROLE_WAITER_MAX_ATTEMPTS
+        }
+    )
+
     # Attach policy
     try:
         iam_client.put_role_policy(
-            PolicyDocument=json.dumps(role_policy),
+            PolicyDocument=role_policy_json,
             PolicyName=POLICY_NAME,
             RoleName=role_name
         )
@@ -426,7 +623,7 @@ def get_existing_role_arn(agent_name):
     Returns:
         str or None: Role ARN if exists, None otherwise
     """
-    iam_client = boto3.client('iam')
+    iam_client = get_client('iam')
     role_name = ROLE_NAME_TEMPLATE.format(agent_name=agent_name)
 
     try:
@@ -25,9 +25,23 @@ MCP_PROTOCOL = 'MCP'
 
 # Timeouts and Limits
 MCP_TIMEOUT_SECONDS = 120
-ROLE_CREATION_WAIT_SECONDS = 10
-MAX_POOLS_TO_LIST = 60
-MAX_POLICIES_TO_LIST = 100
+CREDENTIALS_CACHE_TTL_SECONDS = 600  # Shorter than the bearer token lifetime
+# Stored tokens are reused only if they outlive the runtime launch and the
+# 30-minute status wait that precede the notebook's connection test
+TOKEN_EXPIRY_MARGIN_SECONDS = 2700
+ROLE_WAITER_DELAY_SECONDS = 1
+ROLE_WAITER_MAX_ATTEMPTS = 15
+MAX_POOLS_TO_LIST = 60  # Page size for list_user_pools (service maximum)
+MAX_CLIENTS_TO_LIST = 60  # Page size for list_user_pool_clients (service maximum)
+MAX_POLICIES_TO_LIST = 1000  # Page size for IAM policy listings (service maximum)
+IAM_CLEANUP_MAX_WORKERS = 8
+
+# AWS error codes raised when a request is throttled
+THROTTLING_ERROR_CODES = (
+    'Throttling',
+    'ThrottlingException',
+    'TooManyRequestsException',
+)
 
 # Debug Settings
 DEBUG_MODE = False
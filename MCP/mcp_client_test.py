@@ -3,51 +3,107 @@
 import asyncio
 import json
 import sys
+import time
 from datetime import timedelta
+from urllib.parse import quote
 
-import boto3
-from boto3.session import Session
+from botocore.exceptions import ClientError
 from mcp import ClientSession
 from mcp.client.streamable_http import streamablehttp_client
 
+from aws_setup import _get_aws_session, get_client, get_token_expiry
 from config import (
     SECRETS_NAME, PARAMETER_NAME, MCP_TIMEOUT_SECONDS,
-    AGENTCORE_URL_TEMPLATE
+    AGENTCORE_URL_TEMPLATE, CREDENTIALS_CACHE_TTL_SECONDS,
+    THROTTLING_ERROR_CODES
 )
 
+# Parameter Store names fetched in one GetParameters call (up to 10);
+# add new parameters here rather than issuing extra requests
+_PARAMS = [PARAMETER_NAME]
 
-def _get_credentials_from_aws(region):
+# Process-local cache: region -> (agent_arn, bearer_token, expires_at)
+_CREDENTIALS_CACHE = {}
+
+
+def _get_parameters(ssm_client):
+    """Fetch all required Parameter Store values in one batched call.
+
+    Args:
+        ssm_client: Boto3 SSM client
+
+    Returns:
+        dict: Parameter values keyed by name
+
+    Raises:
+        KeyError: If any parameter does not exist
+    """
+    response = ssm_client.get_parameters(Names=_PARAMS)
+    if response['InvalidParameters']:
+        raise KeyError(
+            f"Parameters not found: {response['InvalidParameters']}")
+    return {param['Name']: param['Value'] for param in response['Parameters']}
+
+
+async def _get_credentials_from_aws(region):
     """Retrieve credentials from AWS services.
 
+    The Parameter Store and Secrets Manager lookups are independent, so both
+    run concurrently in worker threads. Results are cached per region for
+    CREDENTIALS_CACHE_TTL_SECONDS, or until the bearer token is within
+    MCP_TIMEOUT_SECONDS of expiring if that comes first.
+
     Args:
-        region (str): AWS region name
+        region (str): AWS region used as the cache key
 
     Returns:
         tuple: (agent_arn, bearer_token)
 
     Raises:
+        ClientError: If AWS throttling persists after client retries
         SystemExit: If credentials cannot be retrieved
     """
+    cached = _CREDENTIALS_CACHE.get(region)
+    if cached and time.time() < cached[2]:
+        print("✅ Using cached Agent ARN and bearer token")
+        return cached[0], cached[1]
+
     try:
-        # Get Agent ARN from Parameter Store
-        ssm_client = boto3.client('ssm', region_name=region)
-        agent_arn_response = ssm_client.get_parameter(Name=PARAMETER_NAME)
-        agent_arn = agent_arn_response['Parameter']['Value']
+        ssm_client = get_client('ssm')
+        secrets_client = get_client('secretsmanager')
+
+        # Get Agent ARN from Parameter Store and bearer token from
+        # Secrets Manager
+        parameters, response = await asyncio.gather(
+            asyncio.to_thread(_get_parameters, ssm_client),
+            asyncio.to_thread(
+                secrets_client.get_secret_value, SecretId=SECRETS_NAME)
+        )
+
+        agent_arn = parameters[PARAMETER_NAME]
         print(f"✅ Retrieved Agent ARN: {agent_arn}")
 
-        # Get bearer token from Secrets Manager
-        secrets_client = boto3.client('secretsmanager', region_name=region)
-        response = secrets_client.get_secret_value(SecretId=SECRETS_NAME)
         secret_value = response['SecretString']
         parsed_secret = json.loads(secret_value)
         bearer_token = parsed_secret['bearer_token']
         print("✅ Retrieved bearer token from Secrets Manager")
 
+        # Never serve a token past its own expiry
+        expires_at = time.time() + CREDENTIALS_CACHE_TTL_SECONDS
+        token_expiry = get_token_expiry(bearer_token)
+        if token_expiry is not None:
+            expires_at = min(expires_at, token_expiry - MCP_TIMEOUT_SECONDS)
+        _CREDENTIALS_CACHE[region] = (agent_arn, bearer_token, expires_at)
         return agent_arn, bearer_token
 
-    except Exception as e:
+    except ClientError as e:
+        if e.response['Error']['Code'] in THROTTLING_ERROR_CODES:
+            raise
         print(f"❌ Error retrieving credentials: {e}")
         sys.exit(1)
+    except (KeyError, ValueError) as e:
+        print(f"❌ Invalid credentials data: {e}")
+        sys.exit(1)
 
 
 def _validate_credentials(agent_arn, bearer_token):
@@ -75,7 +131,7 @@ def _build_mcp_url(agent_arn, region):
     Returns:
         str: MCP server URL
     """
-    encoded_arn = agent_arn.replace(':', '%3A').replace('/', '%2F')
+    encoded_arn = quote(agent_arn, safe='')
     return AGENTCORE_URL_TEMPLATE.format(
         region=region,
         encoded_arn=encoded_arn
@@ -97,25 +153,36 @@ def _get_request_headers(bearer_token):
     }
 
 
+def _format_tool(tool):
+    """Format one MCP tool for display.
+
+    Args:
+        tool: MCP tool definition
+
+    Returns:
+        str: Tool name, description and parameters, one per line
+    """
+    text = f"🔧 {tool.name}\n   Description: {tool.description}\n"
+    input_schema = getattr(tool, 'inputSchema', None)
+    properties = input_schema.get('properties') if input_schema else None
+    if properties:
+        text += f"   Parameters: {', '.join(properties)}\n"
+    return text
+
+
 def _print_tool_info(tool_result):
     """Print information about available MCP tools.
 
     Args:
         tool_result: MCP tools list result
     """
-    print("\n📋 Available MCP Tools:")
-    print("=" * 50)
-    for tool in tool_result.tools:
-        print(f"🔧 {tool.name}")
-        print(f"   Description: {tool.description}")
-        if hasattr(tool, 'inputSchema') and tool.inputSchema:
-            properties = tool.inputSchema.get('properties', {})
-            if properties:
-                print(f"   Parameters: {list(properties.keys())}")
-        print()
-
-    print("✅ Successfully connected to MCP server!")
-    print(f"Found {len(tool_result.tools)} tools available.")
+    sys.stdout.write(
+        "\n📋 Available MCP Tools:\n"
+        + "=" * 50 + "\n"
+        + "".join(f"{_format_tool(tool)}\n" for tool in tool_result.tools)
+        + "✅ Successfully connected to MCP server!\n"
+        + f"Found {len(tool_result.tools)} tools available.\n"
+    )
 
 
 async def test_mcp_connection():
@@ -124,13 +191,13 @@ async def test_mcp_connection():
     Raises:
         SystemExit: If connection fails or credentials are invalid
     """
-    boto_session = Session()
-    region = boto_session.region_name
+    # Same memoized session the shared clients are built from
+    _, region = _get_aws_session()
 
     print(f"✅ Using AWS region: {region}")
 
     # Get credentials from AWS
-    agent_arn, bearer_token = _get_credentials_from_aws(region)
+    agent_arn, bearer_token = await _get_credentials_from_aws(region)
     _validate_credentials(agent_arn, bearer_token)
 
     # Prepare MCP connection